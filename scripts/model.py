@@ -1,11 +1,13 @@
+import io
 import json
 import os
 import typer
 import yaml
 from dataclasses import dataclass, field
+from itertools import takewhile
 from pathlib import Path
 from shutil import move
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 app = typer.Typer()
 
@@ -48,59 +50,167 @@ def empty_readme():
     path.touch()
 
 
-@app.command(name="readme")
-def readme(directory: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True, readable=True),
-            title: str = typer.Option('', "--title", help="Title for the README"),
-            gh_url: str = typer.Option('', "--gh-url", help="URL for the GitHub Pages")):
+@dataclass
+class MetadataCache:
     """
-    Processes JSON metadata files in a directory, converting them into HTML format.
+    Reusable cache of parsed metadata files.
+    Files are grouped by the resolved directory they were scanned from and are parsed again as soon as
+    the modification time or the size of the file changes.
+    Every load_metadata call replaces the group of its directory, so files that disappeared are dropped
+    without touching other directories. Use prune() to drop a whole directory (e.g. a removed checkout)
+    and clear() to reset the cache.
+    """
+    groups: Dict[Path, Dict[Path, Tuple[Tuple[int, int], Dict[str, Any]]]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return sum(len(group) for group in self.groups.values())
+
+    def load(self, fpath: Path, directory: Optional[Path] = None) -> Dict[str, Any]:
+        """
+        Returns the parsed JSON data of a metadata file, cached in the group of directory (default: its parent).
+        The returned dictionary is shared between callers and must not be modified.
+        """
+        group = self.groups.setdefault((fpath.parent if directory is None else directory).resolve(), {})
+        return self._load(fpath, group, group)
+
+    def scan(self, directory: Path, metadata_files: List[Path]) -> List[Dict[str, Any]]:
+        """
+        Returns the parsed JSON data of the metadata files found in directory
+        and drops the cached files of directory that are not among them.
+        """
+        key = directory.resolve()
+        cached_group, group = self.groups.get(key, {}), {}
+        data = [self._load(fpath, cached_group, group) for fpath in metadata_files]
+        self.groups[key] = group
+        return data
+
+    @staticmethod
+    def _load(fpath: Path, cached_group: Dict, group: Dict) -> Dict[str, Any]:
+        key = fpath.resolve()
+        stat = key.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = cached_group.get(key)
+        if cached is None or cached[0] != signature:
+            with open(key, 'r') as fin:
+                cached = (signature, json.load(fin))
+        group[key] = cached
+        return cached[1]
+
+    def prune(self, directory: Path):
+        """
+        Drops the cached files of all scanned directories below directory.
+        """
+        directory = directory.resolve()
+        for key in [key for key in self.groups if key.is_relative_to(directory)]:
+            del self.groups[key]
+
+    def clear(self):
+        self.groups.clear()
+
+
+@dataclass
+class MetadataEntry:
+    """
+    Parsed metadata file together with its path relative to the repository root.
+    """
+    path: Path
+    rel_path: Path
+    data: Dict[str, Any]
+
+
+@dataclass
+class WriteOp:
+    """
+    Single file that a generator wants to write.
+    """
+    path: Path
+    content: str
+    source: Optional[Path] = None
+
+
+WritePlan = List[WriteOp]
+
+
+@dataclass
+class Topic:
+    state: Dict[str, Optional[bool]] = field(default_factory=lambda: {
+        'Delete': None,
+        'Title': None,
+        'Description': None,
+        'Metadata': None,
+        'Models': None,
+        'GitHub-Pages': None,
+        'Acknowledgments': None
+    })
+    text: Dict[str, Optional[bool]] = field(default_factory=lambda: {
+        'Delete': '',
+        'Title': '## Title\n',
+        'Description': '## 📚 Description\n',
+        'Metadata': '## 📜 Metadata\n',
+        'Models': '## 📂 Models\n',
+        'GitHub-Pages': '## 🔖 **GitHub** Pages\n',
+        'Acknowledgments': '## 👏 Acknowledgments\n'
+    })
+
+    def update_state(self, line: str):
+        for key in self.state:
+            if line.strip() in [f'<!-- {key} !-->', f'<!-- /{key} !-->']:
+                self.state[key] = line.strip() == f'<!-- {key} !-->'
+                return self.state[key]
+        return False
+
+    def reset_state(self, key: str):
+        if self.state[key] is False:
+            self.state[key] = None
+
+    def state_active(self, key: str) -> bool:
+        return self.state[key]
+
+
+def find_metadata_files(directory: Path) -> List[Path]:
+    """
+    Finds all JSON metadata files in the given directory (including subdirectories).
+    """
+    return [fpath for fpath in directory.rglob('*') if fpath.name.lower().startswith('metadata.json')]
+
+
+def load_metadata(directory: Path, root: Optional[Path] = None,
+                  cache: Optional[MetadataCache] = None) -> List[MetadataEntry]:
+    """
+    Parses all JSON metadata files in a directory.
+    The result can be passed to several plan_* or render_* functions, so the tree is only scanned once.
     Args:
         directory (Path): The path to the directory containing JSON metadata files.
-        title (str): Title information.
+        root (Path): The repository root, links are rendered relative to it (default: directory).
+            Relative and absolute paths can be mixed, directory must be inside root.
+        cache (MetadataCache): Cache to reuse parsed files across calls.
+    Returns:
+        list: A list of MetadataEntry objects.
+    Raises:
+        ValueError: If directory is not inside root.
     """
+    root = (directory if root is None else root).resolve()
+    if not directory.resolve().is_relative_to(root):
+        raise ValueError(f"Directory {directory} is not inside the root {root}")
+    rel_directory = directory.resolve().relative_to(root)
+    cache = MetadataCache() if cache is None else cache
+    metadata_files = find_metadata_files(directory)
+    return [MetadataEntry(path=full_path, rel_path=rel_directory.joinpath(full_path.relative_to(directory)),
+                          data=data)
+            for full_path, data in zip(metadata_files, cache.scan(directory, metadata_files))]
 
-    # Function to generate HTML content from the parsed JSON data
-
-    @dataclass
-    class Topic:
-        state: Dict[str, Optional[bool]] = field(default_factory=lambda: {
-            'Delete': None,
-            'Title': None,
-            'Description': None,
-            'Metadata': None,
-            'Models': None,
-            'GitHub-Pages': None,
-            'Acknowledgments': None
-        })
-        text: Dict[str, Optional[bool]] = field(default_factory=lambda: {
-            'Delete': '',
-            'Title': '## Title\n',
-            'Description': '## 📚 Description\n',
-            'Metadata': '## 📜 Metadata\n',
-            'Models': '## 📂 Models\n',
-            'GitHub-Pages': '## 🔖 **GitHub** Pages\n',
-            'Acknowledgments': '## 👏 Acknowledgments\n'
-        })
-
-        def update_state(self, line: str):
-            for key in self.state:
-                if line.strip() in [f'<!-- {key} !-->', f'<!-- /{key} !-->']:
-                    self.state[key] = line.strip() == f'<!-- {key} !-->'
-                    return self.state[key]
-            return False
-
-        def reset_state(self, key: str):
-            if self.state[key] is False:
-                self.state[key] = None
-
-        def state_active(self, key: str) -> bool:
-            return self.state[key]
-
-    # Path to README file
-    readme_fpath = directory.joinpath('README.md')
-    if not readme_fpath.exists():
-        return
 
+def render_readme(readme_text: str, entries: List[MetadataEntry], title: str = '', gh_url: str = '') -> str:
+    """
+    Replaces the marked sections of a README with content generated from the metadata.
+    Args:
+        readme_text (str): The current content of the README file.
+        entries (list): The parsed metadata files.
+        title (str): Title information.
+        gh_url (str): URL for the GitHub Pages.
+    Returns:
+        str: The new content of the README file.
+    """
     topic = Topic()
     text_content = ""
 
@@ -113,70 +223,60 @@ def readme(directory: Path = typer.Argument(..., exists=True, file_okay=False, d
                                       f"* [OCR-Model-Repo-Template](https://github.com/UB-Mannheim/ocr-model-repo-template)")
 
     # Read information about all models
-    if metadata_files := [fpath for fpath in directory.rglob('*') if fpath.name.lower().startswith('metadata.json')]:
+    if entries:
         topic.text['Models'] += '|'.join(['Model', 'OCR-Engine', 'Type of model', 'Description', 'Default model'])+'\n'
         topic.text['Models'] += '|'.join(['---']*5)+'\n'
         software, model_types = [], []
-        for full_path in metadata_files:
-            # Parse the JSON data
-            with open(full_path, 'r') as fin:
-                data = json.load(fin)
+        for entry in entries:
+            data = entry.data
             software.append(data['software']['name'])
             model_types.append(data['model']['type'])
-            topic.text['Models'] += '|'.join([f"[{data['model']['name']}]({str(full_path.parent)[3:]})",
+            # A metadata file in the repository root gets an empty link
+            model_link = '' if entry.rel_path.parent == Path('.') else str(entry.rel_path.parent)
+            topic.text['Models'] += '|'.join([f"[{data['model']['name']}]({model_link})",
                                               data['software']['name'],
                                               data['model']['type'],
                                               data['model']['description'].replace('\n', ' '),
                                               f"<a href=\"{data['model']['defaultmodel']}\" download>Download</a>"])+'\n'
-        topic.text['Description'] += f"This model repository {f'contains **one** model' if len(metadata_files) == 1 else f'contains **{len(metadata_files)}** models'}.\n"
+        topic.text['Description'] += f"This model repository {f'contains **one** model' if len(entries) == 1 else f'contains **{len(entries)}** models'}.\n"
         topic.text['Metadata'] += (f"**Model software**: {', '. join(set(software))}.\\\n"
                                    f"**Model types**: {', '. join(set(model_types))}.\n")
-    with open(readme_fpath, 'r') as file:
-        for line in file:
-            if topic.update_state(line) or any(topic.state.values()):
-                continue
-            for section, active in topic.state.items():
-                if active is False:
-                    if section != 'Delete':
-                        text_content += f"\n<!-- {section} !-->\n{topic.text.get(section)}\n<!-- /{section} !-->\n"
-                    topic.reset_state(section)
-                    break
-            else:  # This else belongs to the for-loop, not the if-statement
-                text_content += line
-
-    with open(readme_fpath, 'w') as file:
-        file.write(text_content)
+    for line in io.StringIO(readme_text):
+        if topic.update_state(line) or any(topic.state.values()):
+            continue
+        for section, active in topic.state.items():
+            if active is False:
+                if section != 'Delete':
+                    text_content += f"\n<!-- {section} !-->\n{topic.text.get(section)}\n<!-- /{section} !-->\n"
+                topic.reset_state(section)
+                break
+        else:  # This else belongs to the for-loop, not the if-statement
+            text_content += line
+    return text_content
 
-@app.command(name="metadata")
-def metadata(directory: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True, readable=True)):
+
+def render_metadata(entry: MetadataEntry) -> str:
     """
-    Processes JSON metadata files in a directory, converting them into HTML format.
+    Generates HTML content from parsed JSON data.
     Args:
-        directory (Path): The path to the directory containing JSON metadata files.
+        entry (MetadataEntry): The parsed metadata file.
+    Returns:
+        str: A string of HTML content.
     """
+    data = entry.data
+    model = data["model"]
+    training = data["training"]
+    evaluation = data.get("evaluation", None)
+    if model.get('license', None):
+        license_info = f"{model.get('license').get('name', '')} (see: {model['license']['url']})"
+    else:
+        license_info = f""
 
-    # Function to generate HTML content from the parsed JSON data
-    def generate_html(data, full_path):
-        """
-        Generates HTML content from parsed JSON data.
-        Args:
-            data (dict): A dictionary containing the metadata.
-        Returns:
-            str: A string of HTML content.
-        """
-        model = data["model"]
-        training = data["training"]
-        evaluation = data.get("evaluation", None)
-        if model.get('license', None):
-            license_info = f"{model.get('license').get('name', '')} (see: {model['license']['url']})"
-        else:
-            license_info = f""
-
-        authors = "".join(
-            [f"<dd>{author['name']} {author['surname']} ({', '.join(author['roles'])}) (ORCID: {author['orcid']})</dd>"
-             for author in data.get("authors", [])])
-
-        html_content = f'''<link rel="stylesheet" href="{''.join(['../'] * len(full_path.parent.parent.parts))}table_hide.css"/>
+    authors = "".join(
+        [f"<dd>{author['name']} {author['surname']} ({', '.join(author['roles'])}) (ORCID: {author['orcid']})</dd>"
+         for author in data.get("authors", [])])
+
+    html_content = f'''<link rel="stylesheet" href="{''.join(['../'] * len(entry.rel_path.parent.parts))}table_hide.css"/>
 <div>
    <h1 id="title">{model["name"]}</h1>
    <p id="paragraph">{model["description"]}</p>
@@ -202,8 +302,8 @@ def metadata(directory: Path = typer.Argument(..., exists=True, file_okay=False,
       <dt id="Epochs">Epochs:</dt>
       <dd>{training["info"].get("direct", 0)}</dd>
    </dl>'''
-        if evaluation:
-            html_content += f'''
+    if evaluation:
+        html_content += f'''
    <h2>Evaluation</h2>
    <dl class="grid">
       <dt id="Information">Information:</dt>
@@ -213,8 +313,8 @@ def metadata(directory: Path = typer.Argument(..., exists=True, file_okay=False,
       <dt id="Result">Result:</dt>
       <dd>{evaluation.get("results","")}/dd>
    </dl>'''
-        if data.get('project', None):
-            html_content += f'''
+    if data.get('project', None):
+        html_content += f'''
    <h2>Project</h2>
    <dl class="grid">
       <dt id="Project">Project:</dt>
@@ -224,51 +324,48 @@ def metadata(directory: Path = typer.Argument(..., exists=True, file_okay=False,
       <dt id="Project-URL">Project-URL:</dt>
       {authors}
    </dl>'''
-        if data.get('uses', None):
-            html_content += f'''     
+    if data.get('uses', None):
+        html_content += f'''     
    <h2>Usage</h2>
    <dl class="grid">
       <dt id="Usage-General">General:</dt>
       <dd>{data["uses"]["general"]}</dd>
    </dl>
    '''
-        html_content += f''' 
+    html_content += f''' 
 </div>
 '''
-        return html_content
-
-    for full_path in [fpath for fpath in directory.rglob('*') if fpath.name.lower().startswith('metadata.json')]:
-        full_path_out = Path('../docs/').joinpath(str(full_path)[3:]).with_suffix('.md')
-        full_path_out.parent.mkdir(parents=True, exist_ok=True)
-        # Parse the JSON data
-        with open(full_path, 'r') as fin:
-            data = json.load(fin)
+    return html_content
 
-        # Generate HTML content
-        html_result = generate_html(data, full_path)
-        # Write Metadata md with html content
-        with open(full_path_out, 'w') as fout:
-            typer.echo(f"Convert {full_path} to {full_path_out}")
-            fout.write(html_result)
 
-
-@app.command(name="index")
-def index(directory: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True, readable=True)):
+def render_index(entries: List[MetadataEntry]) -> str:
     """
-    Generates an HTML index file from JSON metadata files in a directory.
+    Generates the content of the index page.
     Args:
-        directory (Path): The path to the directory containing JSON metadata files.
+        entries (list): The parsed metadata files.
+    Returns:
+        str: A string of HTML content for the index page.
     """
-
-    def generate_html(model_table):
-        """
-        Generates HTML content for the index page.
-        Args:
-            model_table (str): HTML string of model details to be included in the table.
-        Returns:
-            str: A string of HTML content for the index page.
-        """
-        html_content = f'''<link rel="stylesheet" href="table_hide.css"/>
+    model_table = ''''''
+    for entry in entries:
+        data = entry.data
+        # The cached data is shared, so the download link is rewritten locally
+        defaultmodel = data['model']['defaultmodel'].replace('/blob/', '/raw/') \
+            if 'github.com' in data['model']['defaultmodel'] else data['model']['defaultmodel']
+        model_table += f'''         <tr>
+             
+           <th><a href="{str(entry.rel_path.with_suffix(''))}" title="{data['model']['name']}">{data['model']['name']}</a></th>
+           <td>{data["software"]["name"]}</td>
+           <td>{data['model']['type']}</td>
+           <td>{data['model']['description']}</td>
+           <td><a href="{defaultmodel}" download>Download</a></td>
+         </tr>'''
+    if model_table == '''''':
+        return (f"# Page Update Notice\n"
+                f"This page does not contain any metadata files. Please add them according to the instructions and push a new version tag.\\\n"
+                f'For more information, see: <a href="https://github.com/UB-Mannheim/ocr-model-metadata">Metadata tool</a>\\\n'
+                f"Stay tuned for updates!")
+    return f'''<link rel="stylesheet" href="table_hide.css"/>
 <div>
    <h1 id="title">Welcome to the OCR-Model overview</h1>
    <p id="paragraph"> Dive in and explore the collection of models!</p>
@@ -289,38 +386,101 @@ def index(directory: Path = typer.Argument(..., exists=True, file_okay=False, di
     </table>
 </div>
 '''
-        return html_content
 
-    model_table = ''''''
-    for full_path in [fpath for fpath in directory.rglob('*') if fpath.name.lower().startswith('metadata.json')]:
-        # Parse the JSON data
-        with (open(full_path, 'r') as fin):
-            data = json.load(fin)
-            data['model']['defaultmodel'] = data['model']['defaultmodel'].replace('/blob/',
-                                                                                  '/raw/') if 'github.com' in \
-                                                                                              data['model'][
-                                                                                                  'defaultmodel'] else \
-                data['model']['defaultmodel']
-            model_table += f'''         <tr>
-             
-           <th><a href="{str(full_path.with_suffix(''))[3:]}" title="{data['model']['name']}">{data['model']['name']}</a></th>
-           <td>{data["software"]["name"]}</td>
-           <td>{data['model']['type']}</td>
-           <td>{data['model']['description']}</td>
-           <td><a href="{data['model']['defaultmodel']}" download>Download</a></td>
-         </tr>'''
-    if model_table != '''''':
-        # Generate HTML content
-        html_result = generate_html(model_table)
-    else:
-        html_result = (f"# Page Update Notice\n"
-                       f"This page does not contain any metadata files. Please add them according to the instructions and push a new version tag.\\\n"
-                       f'For more information, see: <a href="https://github.com/UB-Mannheim/ocr-model-metadata">Metadata tool</a>\\\n'
-                       f"Stay tuned for updates!")
-    # Write Metadata md with html content
-    with open(Path('index.md'), 'w') as fout:
-        typer.echo(f"Save {Path('index.md')}")
-        fout.write(html_result)
+
+def plan_readme(readme_fpath: Path, entries: List[MetadataEntry], title: str = '', gh_url: str = '') -> WritePlan:
+    """
+    Plans the update of a README file, nothing is written.
+    Returns an empty plan if the README file does not exist.
+    """
+    if not readme_fpath.exists():
+        return []
+    content = render_readme(readme_fpath.read_text(), entries, title=title, gh_url=gh_url)
+    return [WriteOp(path=readme_fpath, content=content)]
+
+
+def plan_metadata(entries: List[MetadataEntry], output_dir: Path) -> WritePlan:
+    """
+    Plans one markdown page per metadata file below output_dir, nothing is written.
+    """
+    return [WriteOp(path=output_dir.joinpath(entry.rel_path).with_suffix('.md'),
+                    content=render_metadata(entry),
+                    source=entry.path)
+            for entry in entries]
+
+
+def plan_index(entries: List[MetadataEntry], output_file: Path) -> WritePlan:
+    """
+    Plans the index page for the metadata files, nothing is written.
+    """
+    return [WriteOp(path=output_file, content=render_index(entries))]
+
+
+def write_file(path: Path, content: str):
+    """
+    Default sink: writes the content to the file system.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as fout:
+        fout.write(content)
+
+
+def apply_write_plan(plan: WritePlan, sink: Callable[[Path, str], None] = write_file):
+    """
+    Passes every planned file to the sink.
+    """
+    for op in plan:
+        sink(op.path, op.content)
+
+
+def _legacy_root(directory: Path) -> Path:
+    """
+    The commands are called from a subdirectory of the repository (e.g. with '../' or '../../'),
+    so links are rendered relative to the leading parent directories in that case.
+    """
+    pardirs = len(list(takewhile(lambda part: part == os.pardir, directory.parts)))
+    return Path(*directory.parts[:pardirs]) if pardirs else directory
+
+
+@app.command(name="readme")
+def readme(directory: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True, readable=True),
+            title: str = typer.Option('', "--title", help="Title for the README"),
+            gh_url: str = typer.Option('', "--gh-url", help="URL for the GitHub Pages")):
+    """
+    Processes JSON metadata files in a directory, converting them into HTML format.
+    Args:
+        directory (Path): The path to the directory containing JSON metadata files.
+        title (str): Title information.
+    """
+    readme_fpath = directory.joinpath('README.md')
+    if not readme_fpath.exists():
+        return
+    entries = load_metadata(directory, root=_legacy_root(directory))
+    apply_write_plan(plan_readme(readme_fpath, entries, title=title, gh_url=gh_url))
+
+
+@app.command(name="metadata")
+def metadata(directory: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True, readable=True)):
+    """
+    Processes JSON metadata files in a directory, converting them into HTML format.
+    Args:
+        directory (Path): The path to the directory containing JSON metadata files.
+    """
+    for op in plan_metadata(load_metadata(directory, root=_legacy_root(directory)), Path('../docs/')):
+        typer.echo(f"Convert {op.source} to {op.path}")
+        write_file(op.path, op.content)
+
+
+@app.command(name="index")
+def index(directory: Path = typer.Argument(..., exists=True, file_okay=False, dir_okay=True, readable=True)):
+    """
+    Generates an HTML index file from JSON metadata files in a directory.
+    Args:
+        directory (Path): The path to the directory containing JSON metadata files.
+    """
+    for op in plan_index(load_metadata(directory, root=_legacy_root(directory)), Path('index.md')):
+        typer.echo(f"Save {op.path}")
+        write_file(op.path, op.content)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from scripts import model
+
+DATA = Path(__file__).parent / 'data'
+# Golden files were generated by the original commands, called from repo/scripts with '../'
+GOLDEN = DATA / 'golden'
+TITLE, GH_URL = 'Title', 'https://example.org/pages'
+
+
+def metadata(name, defaultmodel='https://github.com/a/b/blob/main/model.traineddata'):
+    return {'model': {'name': name, 'description': name, 'type': 'recognition',
+                      'fileformat': 'traineddata', 'defaultmodel': defaultmodel},
+            'software': {'name': 'tesseract'},
+            'training': {'info': {}}}
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+def make_repo(repo, model_dir):
+    model_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copy(DATA / 'metadata.json', model_dir / 'metadata.json')
+    shutil.copy(DATA / 'README.md', repo / 'README.md')
+    (repo / 'scripts').mkdir()
+    return repo
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return make_repo(tmp_path / 'repo', tmp_path / 'repo' / 'models' / 'm1')
+
+
+def test_cli_matches_golden(repo, monkeypatch):
+    monkeypatch.chdir(repo / 'scripts')
+    runner = CliRunner()
+    for args in (['metadata', '../'], ['index', '../'], ['readme', '../', '--title', TITLE, '--gh-url', GH_URL]):
+        assert runner.invoke(model.app, args).exit_code == 0
+    assert (repo / 'docs' / 'models' / 'm1' / 'metadata.md').read_text() == (GOLDEN / 'metadata.md').read_text()
+    assert (repo / 'scripts' / 'index.md').read_text() == (GOLDEN / 'index.md').read_text()
+    assert (repo / 'README.md').read_text() == (GOLDEN / 'README.md').read_text()
+
+
+def test_render_matches_golden(repo):
+    entries = model.load_metadata(repo)
+    assert model.render_metadata(entries[0]) == (GOLDEN / 'metadata.md').read_text()
+    assert model.render_index(entries) == (GOLDEN / 'index.md').read_text()
+    assert (model.render_readme((DATA / 'README.md').read_text(), entries, title=TITLE, gh_url=GH_URL)
+            == (GOLDEN / 'README.md').read_text())
+
+
+def test_render_readme_metadata_in_root_matches_golden(tmp_path):
+    repo = make_repo(tmp_path / 'repo', tmp_path / 'repo')
+    entries = model.load_metadata(repo)
+    assert (model.render_readme((DATA / 'README.md').read_text(), entries, title=TITLE, gh_url=GH_URL)
+            == (GOLDEN / 'README_root.md').read_text())
+
+
+def test_cli_index_two_levels_up(tmp_path, monkeypatch):
+    make_repo(tmp_path / 'new', tmp_path / 'new' / 'models' / 'm1')
+    (tmp_path / 'deep' / 'scripts').mkdir(parents=True)
+    monkeypatch.chdir(tmp_path / 'deep' / 'scripts')
+    result = CliRunner().invoke(model.app, ['index', '../../new'])
+    assert result.exit_code == 0, result.output
+    assert '<a href="new/models/m1/metadata"' in Path('index.md').read_text()
+
+
+def test_load_metadata_mixed_relative_and_absolute_root(repo, monkeypatch):
+    monkeypatch.chdir(repo.parent)
+    entries = model.load_metadata(Path('repo/models'), root=repo.resolve())
+    assert [str(entry.rel_path) for entry in entries] == ['models/m1/metadata.json']
+    with pytest.raises(ValueError, match='not inside the root'):
+        model.load_metadata(repo / 'models', root=repo / 'scripts')
+
+
+def test_cache_reparses_rewritten_file(repo):
+    cache = model.MetadataCache()
+    fpath = repo / 'models' / 'm1' / 'metadata.json'
+    assert cache.load(fpath)['model']['name'] == 'M1'
+    write_json(fpath, metadata('M1 renamed'))
+    stat = fpath.stat()
+    os.utime(fpath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.load(fpath)['model']['name'] == 'M1 renamed'
+
+
+def test_cache_is_pruned_and_not_modified(repo, tmp_path):
+    other = make_repo(tmp_path / 'other', tmp_path / 'other' / 'models' / 'm1')
+    write_json(repo / 'models' / 'm2' / 'metadata.json', metadata('M2'))
+    cache = model.MetadataCache()
+    model.render_index(model.load_metadata(repo, cache=cache))
+    model.load_metadata(other, cache=cache)
+    assert len(cache) == 3
+    assert '/blob/' in cache.load(repo / 'models' / 'm1' / 'metadata.json', repo)['model']['defaultmodel']
+
+    (repo / 'models' / 'm2' / 'metadata.json').unlink()
+    model.load_metadata(repo, cache=cache)
+    assert len(cache) == 2
+    cache.prune(repo)
+    assert len(cache) == 1
+    assert list(cache.groups) == [other.resolve()]
+
+
+def test_render_readme_splits_on_newline_only():
+    readme_text = 'a\x0c<!-- Delete !-->\nb\n<!-- /Delete !-->\nc\n'
+    assert model.render_readme(readme_text, []) == 'a\x0c<!-- Delete !-->\nb\nc\n'
+
+
+def test_plans_go_through_sink(repo):
+    entries = model.load_metadata(repo)
+    plan = (model.plan_metadata(entries, Path('/out/docs'))
+            + model.plan_index(entries, Path('/out/index.md'))
+            + model.plan_readme(repo / 'README.md', entries, title=TITLE))
+    written = {}
+    model.apply_write_plan(plan, sink=written.__setitem__)
+    assert set(written) == {Path('/out/docs/models/m1/metadata.md'), Path('/out/index.md'), repo / 'README.md'}
+    assert written[Path('/out/index.md')] == (GOLDEN / 'index.md').read_text()
+    assert (repo / 'README.md').read_text() == (DATA / 'README.md').read_text()
+    assert not (repo / 'docs').exists()
+    assert model.plan_readme(repo / 'missing' / 'README.md', entries) == []